@@ -1,5 +1,9 @@
 import json
 import socket
+import struct
+
+# every message is prefixed with its length as a 4-byte big-endian integer
+header = struct.Struct('!I')
 
 def connect_to_queue():
     address = ('localhost', 6030)
@@ -7,22 +11,32 @@ def connect_to_queue():
     sock.setblocking(True)
     return sock
 
-def read_line(sock):
-    '''Read a single line from a socket. The line is terminated with CR+LF.'''
+def recv_exact(sock, size):
+    '''Read exactly size bytes from a socket, None if the connection closes.'''
 
-    char = sock.recv(1)
-    if char == b'':
-        return
-    buf = b''
-    while char != b'\r':
-        buf += char
-        char = sock.recv(1)
+    buf = bytearray(size)
+    view = memoryview(buf)
+    while view:
+        received = sock.recv_into(view)
+        if not received:
+            return
+        view = view[received:]
+    return buf
 
-    assert sock.recv(1) == b'\n'
-    return buf.decode('utf-8')
+def read_msg(sock):
+    '''Read a single length-prefixed message from a socket.'''
+
+    head = recv_exact(sock, header.size)
+    if head is None:
+        return
+    (size,) = header.unpack(head)
+    body = recv_exact(sock, size)
+    if body is not None:
+        return body.decode('utf-8')
 
 def send_msg(sock, msg):
-    return sock.sendall(msg.encode('utf-8') + b'\r\n')
+    data = msg.encode('utf-8')
+    return sock.sendall(header.pack(len(data)) + data)
 
 def send_json(sock, msg):
     return send_msg(sock, json.dumps(msg))
@@ -34,7 +48,7 @@ def send_command(sock, cmd, **params):
         msg = cmd
     return send_msg(sock, msg)
 
-def read_json_line(sock):
-    line = read_line(sock)
-    if line:
-        return json.loads(line)
+def read_json(sock):
+    msg = read_msg(sock)
+    if msg:
+        return json.loads(msg)
@@ -1096,7 +1096,7 @@ def update_place(place, want_isa=None):
     chat.send_command(sock, 'match', **msg)
 
     while True:
-        msg = chat.read_json_line(sock)
+        msg = chat.read_json(sock)
         if msg is None:
             break
         yield(msg)
@@ -1150,7 +1150,7 @@ def matcher_queue_send(cmd):
     chat.send_command(sock, cmd)
 
     while True:
-        msg = chat.read_json_line(sock)
+        msg = chat.read_json(sock)
         if msg is None:
             break
         print(msg)
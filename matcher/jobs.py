@@ -8,7 +8,7 @@ def matcher_queue_request(command, **params):
 
     replies = []
     while True:
-        msg = chat.read_json_line(sock)
+        msg = chat.read_json(sock)
         if msg is None:
             break
         replies.append(msg)
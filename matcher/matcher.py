@@ -147,19 +147,35 @@ def get_max_dist_from_criteria(tags):
 
     return max(max_dists) if max_dists else None
 
+def sql_quote(value):
+    return "'{}'".format(value.replace("'", "''"))
+
+def sql_text_array(values):
+    return 'array[{}]::text[]'.format(', '.join(sql_quote(v) for v in values))
+
 def hstore_query(tags):
-    '''hstore query for use with osm2pgsql database'''
-    cond = []
+    '''hstore query for use with osm2pgsql database
+
+    Keys without values are checked with a single ?| and each key with values
+    gets one array overlap, so the number of OR branches is bounded by the
+    number of distinct keys, not the number of tags.'''
+    keys = set()
+    values = defaultdict(set)
     for tag in tags:
         if '=' not in tag:
-            cond.append(f"(tags ? '{tag}')")
+            keys.add(tag)
             continue
-        k, v = tag.split('=')
-        cond.append(f"('{v}' = any(string_to_array((tags->'{k}'), ';')))")
-        if '_' not in v:
-            continue
-        space = v.replace('_', ' ')
-        cond.append(f"('{space}' = any(string_to_array((tags->'{k}'), ';')))")
+        k, _, v = tag.partition('=')
+        values[k].add(v)
+        if '_' in v:
+            values[k].add(v.replace('_', ' '))
+
+    cond = []
+    if keys:
+        cond.append(f'(tags ?| {sql_text_array(sorted(keys))})')
+    for k, v in sorted(values.items()):
+        cond.append(f"(string_to_array((tags->{sql_quote(k)}), ';') && "
+                    f'{sql_text_array(sorted(v))})')
 
     return ' or\n '.join(cond)
 
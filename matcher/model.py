@@ -1,12 +1,13 @@
 # coding: utf-8
 from flask import g, has_app_context
-from sqlalchemy import func
-from sqlalchemy.schema import ForeignKeyConstraint, ForeignKey, Column
+from sqlalchemy import func, event, bindparam
+from sqlalchemy.schema import ForeignKeyConstraint, ForeignKey, Column, Index
 from sqlalchemy.types import BigInteger, Float, Integer, String, Boolean, DateTime, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.associationproxy import association_proxy
+from sqlalchemy.ext import baked
 from sqlalchemy.orm.collections import attribute_mapped_collection
-from geoalchemy2 import Geography  # noqa: F401
+from geoalchemy2 import Geography, Geometry
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.orm import relationship, backref, column_property
 from sqlalchemy.sql.expression import cast
@@ -23,6 +24,21 @@ import re
 
 re_lau_code = re.compile(r'^[A-Z]{2}([^A-Z].+)$')
 
+# languages skipped by Item.get_names
+names_skip_lang = frozenset({'ar', 'arc', 'pl'})
+
+defunct_cat_words = ['demolish', 'disestablishment', 'defunct', 'abandon', 'mothballed',
+                     'decommission', 'former', 'dismantled', 'disused', 'disassembled',
+                     'disband', 'scrapped', 'unused', 'closed', 'condemned', 'redundant']
+re_defunct_cat = re.compile('|'.join(map(re.escape, defunct_cat_words)))
+
+defunct_cat_exclude = {'Defunct baseball venues in the United States',
+                       'Defunct National Football League venues',
+                       'Enclosed roller coasters',
+                       'Former civil parishes in England',
+                       'Capitals of former nations',
+                       'Former state capitals in the United States'}
+
 Base = declarative_base()
 Base.query = session.query_property()
 
@@ -88,7 +104,7 @@ class User(Base, UserMixin):
 class IsA(Base):
     __tablename__ = 'isa'
     item_id = Column(Integer, primary_key=True, autoincrement=False)
-    entity = Column(postgresql.JSON)
+    entity = Column(postgresql.JSONB)
     qid = column_property('Q' + cast(item_id, String))
     label = Column(String)
 
@@ -189,23 +205,39 @@ class Item(Base):
     item_id = Column(Integer, primary_key=True, autoincrement=False)
     location = Column(Geography('POINT', spatial_index=True), nullable=False)
     enwiki = Column(String, index=True)
-    entity = Column(postgresql.JSON)
+    entity = Column(postgresql.JSONB)
     categories = Column(postgresql.ARRAY(String))
     old_tags = Column(postgresql.ARRAY(String))
     qid = column_property('Q' + cast(item_id, String))
     ewkt = column_property(func.ST_AsEWKT(location), deferred=True)
+    lat = column_property(func.ST_Y(cast(location, Geometry)))
+    lon = column_property(func.ST_X(cast(location, Geometry)))
+    # 'instance of' QIDs extracted by PostgreSQL, avoids loading the whole entity
+    isa_qids = column_property(
+        func.jsonb_path_query_array(entity, '$.claims.P31[*].mainsnak.datavalue.value.id',
+                                    type_=postgresql.JSONB),
+        deferred=True)
     query_label = Column(String, index=True)
     # extract = Column(String)
     extract_names = Column(postgresql.ARRAY(String))
 
+    # chunk queries filter on location cast to geometry, the geography
+    # GiST index can't be used for that
+    __table_args__ = (
+        Index('item_location_spgist',
+              cast(location, Geometry),
+              postgresql_using='spgist'),
+    )
+
     db_tags = relationship('ItemTag',
+                           lazy='selectin',
                            collection_class=set,
                            cascade='save-update, merge, delete, delete-orphan',
                            backref='item')
 
     tags = association_proxy('db_tags', 'tag_or_key')
 
-    isa = relationship('IsA', secondary='item_isa')
+    isa = relationship('IsA', secondary='item_isa', lazy='selectin')
     wiki_extracts = relationship('Extract',
                                  collection_class=attribute_mapped_collection('site'),
                                  cascade='save-update, merge, delete, delete-orphan',
@@ -240,9 +272,12 @@ class Item(Base):
         if not self.entity:
             return self.enwiki or self.query_label or None
 
-        l = self.lang_text('labels', lang=lang)
-        if l:
-            return l['value']
+        cache = self.entity_cache()
+        key = ('label', lang)
+        if key not in cache:
+            l = self.lang_text('labels', lang=lang)
+            cache[key] = l['value'] if l else None
+        return cache[key]
 
     def label_detail(self, lang='en'):
         return self.lang_text('labels', lang=lang)
@@ -302,7 +337,7 @@ class Item(Base):
     @classmethod
     def get_by_qid(cls, qid):
         if qid and len(qid) > 1 and qid[0].upper() == 'Q' and qid[1:].isdigit():
-            return cls.query.get(qid[1:])
+            return cls.query.get(int(qid[1:]))
 
     def label_and_qid(self, lang='en'):
         label = self.label(lang=lang)
@@ -316,8 +351,7 @@ class Item(Base):
         return 'https://www.wikidata.org/wiki/Q{}'.format(self.item_id)
 
     def get_lat_lon(self):
-        return session.query(func.ST_Y(self.location),
-                             func.ST_X(self.location)).one()
+        return (self.lat, self.lon)
 
     def get_osm_url(self, zoom=18):
         lat, lon = self.get_lat_lon()
@@ -336,7 +370,17 @@ class Item(Base):
     def ref_keys(self):
         return {f'ref:nrhp={v}' for v in (self.ref_nrhp() or [])}
 
+    def tag_cache(self):
+        ''' Values derived from tags and categories, cleared when they change. '''
+        return self.__dict__.setdefault('_tag_cache', {})
+
     def disused_tags(self):
+        cache = self.tag_cache()
+        if 'disused_tags' not in cache:
+            cache['disused_tags'] = frozenset(self.build_disused_tags())
+        return cache['disused_tags']
+
+    def build_disused_tags(self):
         tags = set()
         prefixes = ('disused', 'was', 'abandoned', 'demolished',
                     'destroyed', 'ruins', 'historic')
@@ -388,9 +432,7 @@ https://www.wikidata.org/wiki/{self.qid}
         if not self.entity or 'claims' not in self.entity:
             return []
 
-        return [i['mainsnak']['datavalue']['value']['id']
-                for i in self.entity['claims'].get('P31', [])
-                if 'datavalue' in i['mainsnak']]
+        return [v['id'] for v in self.claim_values('P31')]
 
     def identifiers(self):
         ret = set()
@@ -450,11 +492,7 @@ https://www.wikidata.org/wiki/{self.qid}
         return tags
 
     def ref_nrhp(self):
-        if self.entity:
-            return [i['mainsnak']['datavalue']['value']
-                    for i in self.entity['claims'].get('P649', [])]
-        else:
-            return []
+        return self.claim_values('P649') if self.entity else []
 
     def is_cricket_ground(self):
         return any('cricket' in name.lower() for name in self.names())
@@ -527,36 +565,23 @@ https://www.wikidata.org/wiki/{self.qid}
         self.extract_names = wikipedia.html_names(self.extract)
 
     def get_oql(self):
-        lat, lon = session.query(func.ST_Y(self.location), func.ST_X(self.location)).one()
+        lat, lon = self.get_lat_lon()
+        osm_filter = 'around:1000,{:f},{:f}'.format(lat, lon)
         union = []
         for tag in self.tags:
-            osm_filter = 'around:1000,{:f},{:f}'.format(lat, lon)
-            union += oql_from_tag(tag, False, osm_filter)
+            union += oql_from_tag(tag, filters=osm_filter)
         return union
 
     def coords(self):
-        return session.query(func.ST_Y(self.location), func.ST_X(self.location)).one()
+        return self.get_lat_lon()
 
     def image_filenames(self):
-        return [i['mainsnak']['datavalue']['value']
-                for i in self.entity['claims'].get('P18', [])]
+        return self.claim_values('P18')
 
     def defunct_cats(self):
-        words = {'demolish', 'disestablishment', 'defunct', 'abandon', 'mothballed',
-                 'decommission', 'former', 'dismantled', 'disused', 'disassembled',
-                 'abandoned', 'disband', 'scrapped', 'unused', 'closed', 'condemned',
-                 'redundant'}
-
-        exclude = {'Defunct baseball venues in the United States',
-                   'Defunct National Football League venues',
-                   'Enclosed roller coasters',
-                   'Former civil parishes in England',
-                   'Capitals of former nations',
-                   'Former state capitals in the United States'}
-
         found = []
         for item_cat in self.categories or []:
-            if item_cat in exclude:
+            if item_cat in defunct_cat_exclude:
                 continue
             if item_cat.startswith('Former') and item_cat.endswith('Railway stations'):
                 # Category:Railway stations in the United Kingdom by former operator
@@ -564,17 +589,46 @@ https://www.wikidata.org/wiki/{self.qid}
                 # Most of the stations in these subcategories still exist.
                 # If a station doesn't exist it'll be in other defunct categories.
                 continue
-            lc_item_cat = item_cat.lower()
-            found += [item_cat for i in words if i in lc_item_cat]
+            if re_defunct_cat.search(item_cat.lower()):
+                found.append(item_cat)
         return found
 
     def get_claim(self, pid):
-        return [i['mainsnak']['datavalue']['value']
-                for i in self.entity['claims'].get(pid, [])]
+        return self.claim_values(pid)
+
+    def entity_cache(self):
+        ''' Values derived from the entity, cleared when the entity is replaced. '''
+        entity = self.entity
+        if self.__dict__.get('_cache_entity') is not entity:
+            self._cache_entity = entity
+            self._entity_cache = {}
+        return self._entity_cache
+
+    def claim_values(self, pid):
+        cache = self.entity_cache()
+        key = ('claim', pid)
+        if key not in cache:
+            cache[key] = [i['mainsnak']['datavalue']['value']
+                          for i in self.entity['claims'].get(pid, [])
+                          if 'datavalue' in i['mainsnak']]
+        return cache[key]
 
     @property
     def criteria(self):
-        return {('Tag:' if '=' in t else 'Key:') + t for t in self.tags or []}
+        cache = self.tag_cache()
+        if 'criteria' not in cache:
+            cache['criteria'] = frozenset(('Tag:' if '=' in t else 'Key:') + t
+                                          for t in self.tags or [])
+        return cache['criteria']
+
+    def tag_index(self):
+        ''' (tag_or_key, key, value) for each tag, value is None for a key. '''
+        cache = self.tag_cache()
+        if 'tag_index' not in cache:
+            cache['tag_index'] = tuple(
+                (t,) + (tuple(t.split('=', 1)) if '=' in t else (t, None))
+                for t in self.tags)
+        return cache['tag_index']
 
     @property
     def category_map(self):
@@ -711,24 +765,20 @@ https://www.wikidata.org/wiki/{self.qid}
             return
 
         names = defaultdict(list)
-        skip_lang = {'ar', 'arc', 'pl'}
+        sitelinks = item.get('sitelinks', {})
         # only include aliases if there are less than 6 other names
-        if len(item.get('sitelinks', {})) < 6 and len(item['labels']) < 6:
+        if len(sitelinks) < 6 and len(item['labels']) < 6:
             for k, v in item.get('aliases', {}).items():
-                if k in skip_lang:
+                if k in names_skip_lang or len(v) > 3:
                     continue
-                if len(v) > 3:
-                    continue
-                for name in v:
-                    names[name].append(('alias', k))
+                for alias in v:
+                    names[alias['value']].append(('alias', k))
         for k, v in item['labels'].items():
-            if k in skip_lang:
-                continue
-            names[v].append(('label', k))
-        for k, v in item.get('sitelinks', {}).items():
-            if k + 'wiki' in skip_lang:
-                continue
-            names[v].append(('sitelink', k))
+            if k not in names_skip_lang:
+                names[v['value']].append(('label', k))
+        for k, v in sitelinks.items():
+            if not (k.endswith('wiki') and k[:-4] in names_skip_lang):
+                names[v['title']].append(('sitelink', k))
         return names
 
     def first_paragraph_all(self, languages):
@@ -830,6 +880,16 @@ https://www.wikidata.org/wiki/{self.qid}
                      reverse=True)[:10]
         return [v for k, v in top]
 
+@event.listens_for(Item.db_tags, 'append')
+@event.listens_for(Item.db_tags, 'remove')
+@event.listens_for(Item.categories, 'set')
+def clear_tag_cache(item, *args):
+    item.__dict__.pop('_tag_cache', None)
+
+@event.listens_for(Item, 'expire')
+@event.listens_for(Item, 'refresh')
+def clear_tag_cache_on_reload(item, *args):
+    item.__dict__.pop('_tag_cache', None)
 
 class ItemTag(Base):
     __tablename__ = 'item_tag'
@@ -924,18 +984,9 @@ class ItemCandidate(Base):
                 if key.startswith('name:')}
 
     def matching_tags(self):
-        tags = []
-
-        for tag_or_key in self.item.tags:
-            if '=' not in tag_or_key and tag_or_key in self.tags:
-                tags.append(tag_or_key)
-                continue
-            key, _, value = tag_or_key.partition('=')
-            if self.tags.get(key) == value:
-                tags.append(tag_or_key)
-                continue
-
-        return tags
+        tags = self.tags
+        return [tag_or_key for tag_or_key, key, value in self.item.tag_index()
+                if (key in tags if value is None else tags.get(key) == value)]
 
     def update(self, candidate):
         for k, v in candidate.items():
@@ -1241,12 +1292,30 @@ class Timing(Base):
     name = Column(String, nullable=False)
     seconds = Column(Float, nullable=False)
 
+bakery = baked.bakery()
+
+def query_bad(item_ids):
+    # baked, so the query is built and compiled once, not on every call
+    # item IDs are passed as one array, so the SQL is the same for any number of items
+    q = bakery(lambda session: session.query(BadMatch.item_id))
+    q += lambda q: q.filter(BadMatch.item_id == func.any(bindparam('item_ids')))
+    return {item_id for item_id, in q(session()).params(item_ids=list(item_ids))}
+
 def get_bad(items):
     if not items:
         return {}
-    q = (session.query(BadMatch.item_id)
-                .filter(BadMatch.item_id.in_([i.item_id for i in items])))
-    return {item_id for item_id, in q}
+    item_ids = {i.item_id for i in items}
+    if not has_app_context():
+        return query_bad(item_ids)
+
+    # remember which items have bad matches for the rest of the request,
+    # only items we haven't seen before need to be looked up
+    known = g.setdefault('bad_match_item_ids', {})
+    unknown = item_ids - known.keys()
+    if unknown:
+        bad = query_bad(unknown)
+        known.update((item_id, item_id in bad) for item_id in unknown)
+    return {item_id for item_id in item_ids if known[item_id]}
 
 class Language(Base):
     __tablename__ = 'language'
@@ -8,6 +8,7 @@ from flask import current_app
 from time import sleep
 from . import user_agent_headers, mail
 from collections import defaultdict
+from functools import lru_cache
 
 re_slot_available = re.compile(r'^Slot available after: ([^,]+), in (-?\d+) seconds?\.$')
 re_available_now = re.compile(r'^\d+ slots available now.$')
@@ -33,10 +34,11 @@ class OverpassError(Exception):
     def __init__(self, r):
         self.r = r
 
-def run_query(oql, error_on_rate_limit=True):
+def run_query(oql, error_on_rate_limit=True, stream=False):
     r = requests.post(endpoint(),
                       data=oql.encode('utf-8'),
-                      headers=user_agent_headers())
+                      headers=user_agent_headers(),
+                      stream=stream)
 
     if (error_on_rate_limit and
             r.status_code == 429 and
@@ -178,9 +180,12 @@ def oql_point_element_filter(key, values, filters=''):
     t = 'rel' if relation_only else 'nwr'
     return '{}{}[{}];'.format(t, filters, tag.replace('␣', ' '))
 
-def oql_from_tag(tag, filters='area.a'):
+@lru_cache(maxsize=4096)
+def tag_filter_parts(tag):
+    '''element types and filter for a tag, the parts of the OQL that don't
+    depend on the area filter'''
     if tag == 'highway':
-        return []
+        return ()
     # optimisation: we only expect route, type or site on relations
     relation_only = tag == 'site'
 
@@ -189,7 +194,7 @@ def oql_from_tag(tag, filters='area.a'):
     if '=' in tag:
         k, _, v = tag.partition('=')
         if tag == 'type=waterway' or k == 'route' or tag == 'type=route':
-            return []  # ignore because osm2pgsql only does multipolygons
+            return ()  # ignore because osm2pgsql only does multipolygons
         if k in {'site', 'type', 'route'}:
             relation_only = True
         if not k.isalnum() or not v.isalnum():
@@ -197,8 +202,12 @@ def oql_from_tag(tag, filters='area.a'):
     elif not tag.isalnum():
         tag = '"{}"'.format(tag)
 
-    return ['\n    {}({})[{}]{};'.format(t, filters, tag, name_filter)
-            for t in (('rel',) if relation_only else ('node', 'way', 'rel'))]
+    types = ('rel',) if relation_only else ('node', 'way', 'rel')
+    return tuple((t, '[{}]{};'.format(tag, name_filter)) for t in types)
+
+def oql_from_tag(tag, filters='area.a'):
+    return ['\n    {}({}){}'.format(t, filters, tag_filter)
+            for t, tag_filter in tag_filter_parts(tag)]
 
     # return ['\n    {}(area.a)[{}]{};'.format(t, tag, name_filter) for ('node', 'way', 'rel')]
 
@@ -1,9 +1,10 @@
 from flask import current_app, url_for, g, abort
 from .model import Base, Item, ItemCandidate, PlaceItem, ItemTag, Changeset, IsA, osm_type_enum, get_bad
 from sqlalchemy.types import BigInteger, Float, Integer, JSON, String, DateTime, Boolean
-from sqlalchemy import func, select, cast
+from sqlalchemy import func, select, cast, bindparam
 from sqlalchemy.schema import ForeignKeyConstraint, ForeignKey, Column, UniqueConstraint
-from sqlalchemy.orm import relationship, backref, column_property, object_session, deferred, load_only
+from sqlalchemy.orm import (relationship, backref, column_property, object_session, deferred,
+                            load_only, contains_eager)
 from sqlalchemy.orm.exc import MultipleResultsFound
 from sqlalchemy.sql.expression import true, false, or_
 from geoalchemy2 import Geography, Geometry
@@ -742,9 +743,20 @@ class Place(Base):
                 pass
         debug('save items')
         seen = {}
+
+        # load existing items and links for this place with one query each,
+        # rather than a query (and autoflush) per item
+        item_ids = [int(qid[1:]) for qid in items.keys()]
+        # item IDs are passed as one array, not one bind parameter per item
+        q = (Item.query.filter(Item.item_id == func.any(bindparam('item_ids')))
+                       .params(item_ids=item_ids))
+        existing_items = {item.item_id: item for item in q}
+        place_items = {link.item_id: link
+                       for link in PlaceItem.query.filter_by(place=self)}
+
         for qid, v in items.items():
             wikidata_id = int(qid[1:])
-            item = Item.query.get(wikidata_id)
+            item = existing_items.get(wikidata_id)
 
             debug(f'saving: {qid}')
 
@@ -780,17 +792,15 @@ class Place(Base):
 
             seen[qid] = item
 
-            existing = PlaceItem.query.filter_by(item=item, place=self).one_or_none()
-            if not existing:
+            if wikidata_id not in place_items:
                 place_item = PlaceItem(item=item, place=self)
                 session.add(place_item)
+                place_items[wikidata_id] = place_item
             debug(f'saved: {qid}')
 
-        for item in self.items:
-            if item.qid in seen:
-                continue
-            link = PlaceItem.query.filter_by(item=item, place=self).one()
-            session.delete(link)
+        for item_id, link in place_items.items():
+            if f'Q{item_id}' not in seen:
+                session.delete(link)
         debug('done')
 
         return seen
@@ -944,6 +954,7 @@ class Place(Base):
                                  PlaceItem.place == self,
                                  or_(PlaceItem.done.is_(None),
                                      PlaceItem.done != true()))
+                         .options(contains_eager(PlaceItem.item))
                          .order_by(PlaceItem.item_id))
 
     def run_matcher(self, debug=False, progress=None, want_isa=None):
@@ -961,52 +972,63 @@ class Place(Base):
         total = place_items.count()
         # too many items means something has gone wrong
         assert total < 200_000
-        for num, place_item in enumerate(place_items):
-            item = place_item.item
-
-            if debug:
-                print('searching for', item.label())
-                print(item.tags)
+        # work in batches, each batch is loaded after the previous commit so
+        # the eager loads of tags and isa cover the whole batch
+        last_item_id = None
+        while True:
+            q = place_items
+            if last_item_id is not None:
+                q = q.filter(PlaceItem.item_id > last_item_id)
+            batch = q.limit(100).all()
+            if not batch:
+                break
 
-            item_isa_set = set(item.instanceof())
-            skip_item = want_isa and not (item_isa_set & want_isa)
+            for place_item in batch:
+                item = place_item.item
 
-            if skip_item and item.skip_item_during_match():
-                candidates = []
-            else:
-                t0 = time()
-                candidates = matcher.find_item_matches(cur, item, self.prefix, debug=debug)
-                seconds = time() - t0
                 if debug:
-                    print('find_item_matches took {:.1f}'.format(seconds))
-                    print('{}: {}'.format(len(candidates), item.label()))
-
-            progress(candidates, item)
+                    print('searching for', item.label())
+                    print(item.tags)
 
-            # if this is a refresh we remove candidates that no longer match
-            as_set = {(i['osm_type'], i['osm_id']) for i in candidates}
-            for c in item.candidates[:]:
-                if c.edits.count():
-                    continue  # foreign keys mean we can't remove saved candidates
-                if (c.osm_type, c.osm_id) not in as_set:
-                    c.bad_matches.delete()
-                    session.delete(c)
-
-            if not candidates:
-                continue
+                item_isa_set = set(item.instanceof())
+                skip_item = want_isa and not (item_isa_set & want_isa)
 
-            for i in candidates:
-                c = ItemCandidate.query.get((item.item_id, i['osm_id'], i['osm_type']))
-                if c:
-                    c.update(i)
+                if skip_item and item.skip_item_during_match():
+                    candidates = []
                 else:
-                    c = ItemCandidate(**i, item=item)
-                    session.add(c)
+                    t0 = time()
+                    candidates = matcher.find_item_matches(cur, item, self.prefix, debug=debug)
+                    seconds = time() - t0
+                    if debug:
+                        print('find_item_matches took {:.1f}'.format(seconds))
+                        print('{}: {}'.format(len(candidates), item.label()))
+
+                progress(candidates, item)
+
+                # if this is a refresh we remove candidates that no longer match
+                as_set = {(i['osm_type'], i['osm_id']) for i in candidates}
+                for c in item.candidates[:]:
+                    if c.edits.count():
+                        continue  # foreign keys mean we can't remove saved candidates
+                    if (c.osm_type, c.osm_id) not in as_set:
+                        c.bad_matches.delete()
+                        session.delete(c)
+
+                if not candidates:
+                    continue
+
+                for i in candidates:
+                    c = ItemCandidate.query.get((item.item_id, i['osm_id'], i['osm_type']))
+                    if c:
+                        c.update(i)
+                    else:
+                        c = ItemCandidate(**i, item=item)
+                        session.add(c)
 
-            place_item.done = True
+                place_item.done = True
 
-            if num % 100 == 0:
-                session.commit()
+            last_item_id = batch[-1].item_id
+            session.commit()
 
         self.item_count = self.items.count()
         self.candidate_count = self.items_with_candidates_count()
@@ -1019,9 +1041,8 @@ class Place(Base):
             def progress(msg):
                 pass
 
-        isa_map = {item.qid: [isa_qid for isa_qid in item.instanceof()]
-                   for item in self.items}
-        isa_map = {qid: l for qid, l in isa_map.items() if l}
+        q = self.items.with_entities(Item.qid, Item.isa_qids)
+        isa_map = {qid: isa_qids for qid, isa_qids in q if isa_qids}
 
         if not isa_map:
             return
@@ -1048,7 +1069,7 @@ class Place(Base):
                     session.add(isa)
                 isa_obj_map[isa_qid] = isa
                 isa_objects.append(isa)
-            item = Item.query.get(qid[1:])
+            item = Item.query.get(int(qid[1:]))
             item.isa = isa_objects
 
         for qid, entity in wikidata_api.entity_iter(download_isa):
@@ -1212,7 +1212,8 @@ def api_get(wikidata_id, entity, radius):
 @app.route('/api/1/place_items/<osm_type>/<osm_id>')
 def api_place_items(osm_type, osm_id):
     place = Place.get_by_osm(osm_type, osm_id)
-    items = [{'qid': item.qid, 'label': item.query_label} for item in place.items]
+    q = place.items.with_entities(Item.qid, Item.query_label)
+    items = [{'qid': qid, 'label': label} for qid, label in q]
 
     return jsonify({
         'osm_type': osm_type,
@@ -66,7 +66,7 @@ def ws_matcher(ws_sock, osm_type, osm_id):
         while not ws_sock.closed:
             readable = select.select([queue_socket], [], [], timeout=PING_SECONDS)[0]
             if readable:
-                item = chat.read_line(queue_socket)
+                item = chat.read_msg(queue_socket)
             else:  # timeout
                 item = json.dumps({'type': 'ping'})
 
@@ -760,7 +760,7 @@ def names_from_entity(entity, skip_lang=None):
         ret[v['value']].append(('label', k))
 
     for k, v in entity['sitelinks'].items():
-        if k + 'wiki' in skip_lang:
+        if k.endswith('wiki') and k[:-4] in skip_lang:
             continue
         title = v['title']
         if title.startswith(cat_start):
@@ -82,12 +82,21 @@ def process_queue():
                 return
             to_client(send_queue, 'run_query', msg)
             print('run query')
-            r = overpass.run_query(oql)
+            # write to a temporary file, so a failed download doesn't leave a
+            # partial chunk that looks complete on the next run
+            part = filename + '.part'
+            try:
+                with overpass.run_query(oql, stream=True) as r, \
+                        open(part, 'wb') as out:
+                    for block in r.iter_content(chunk_size=1 << 20):
+                        out.write(block)
+                os.replace(part, filename)
+            except BaseException:
+                if os.path.exists(part):
+                    os.unlink(part)
+                raise
             print('query complete')
-            with open(filename, 'wb') as out:
-                out.write(r.content)
             space_alert.check_free_space(app.config)
-        print(msg)
         to_client(send_queue, 'chunk', msg)
     print('item complete')
     send_queue.put({'type': 'done'})
@@ -267,8 +276,10 @@ class MatcherJob(threading.Thread):
     def send(self, msg_type, **data):
         data['time'] = time() - self.t0
         data['type'] = msg_type
+        # serialise once, every subscriber gets the same line
+        line = json.dumps(data)
         for status_queue in self.subscribers.values():
-            status_queue.put(data)
+            status_queue.put((msg_type, line))
 
     def status(self, msg):
         if msg:
@@ -290,7 +301,7 @@ class MatcherJob(threading.Thread):
             'time': time() - self.t0,
             'type': 'connected',
         }
-        status_queue.put(msg)
+        status_queue.put((msg['type'], json.dumps(msg)))
         print('subscribe', self.name)
         self.subscribers[thread_name] = status_queue
         return status_queue
@@ -422,13 +433,10 @@ class MatcherJob(threading.Thread):
 
         complete = False
         while True:
-            print('read from send queue')
             msg = send_queue.get()
-            print('read complete')
             if msg is None:
                 print('done (msg is None)')
                 break
-            print('message type {}'.format(repr(msg['type'])))
             if msg['type'] == 'run_query':
                 chunk_num = msg['num']
                 self.send('get_chunk', chunk_num=chunk_num)
@@ -491,6 +499,9 @@ class RequestHandler(socketserver.BaseRequestHandler):
     def send_msg(self, msg):
         return chat.send_json(self.request, msg)
 
+    def send_line(self, line):
+        return chat.send_msg(self.request, line)
+
     def join_job(self):
         return
 
@@ -519,24 +530,19 @@ class RequestHandler(socketserver.BaseRequestHandler):
             self.job_thread.start()
 
         while True:
-            msg = updates.get()
+            msg_type, line = updates.get()
             try:
-                self.send_msg(msg)
-                if msg['type'] in ('done', 'error'):
+                self.send_line(line)
+                if msg_type in ('done', 'error'):
                     break
             except BrokenPipeError:
                 self.job_thread.unsubscribe(t.name)
                 break
 
     def stop_job(self):
-        for t in threading.enumerate():
-            if not isinstance(t, MatcherJob):
-                continue
-            print(t.osm_type, t.osm_id)
-            if t.osm_type != self.osm_type or t.osm_id != self.osm_id:
-                continue
-            print('STOP')
-            t.stop()
+        if self.job_thread:
+            print('STOP', self.osm_type, self.osm_id)
+            self.job_thread.stop()
 
     def handle_message(self, msg):
         print(f'handle: {msg!r}')
@@ -549,9 +555,7 @@ class RequestHandler(socketserver.BaseRequestHandler):
             return self.match_place(json_msg)
         if msg == 'jobs':
             job_list = []
-            for t in threading.enumerate():
-                if not isinstance(t, MatcherJob):
-                    continue
+            for t in list(active_jobs.values()):
                 start = datetime.utcfromtimestamp(int(t.start_time))
                 item = {
                     'osm_id': t.osm_id,
@@ -571,7 +575,7 @@ class RequestHandler(socketserver.BaseRequestHandler):
 
     def handle(self):
         print('New connection from %s:%s' % self.client_address)
-        msg = chat.read_line(self.request)
+        msg = chat.read_msg(self.request)
 
         with app.app_context():
             try:
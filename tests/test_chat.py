@@ -0,0 +1,15 @@
+from matcher import chat
+import socket
+
+def test_send_and_read_msg():
+    a, b = socket.socketpair()
+    chat.send_msg(a, 'ping')
+    chat.send_command(a, 'match', osm_type='way', osm_id=1)
+    chat.send_json(a, {'type': 'done', 'msg': 'café'})
+    a.close()
+
+    assert chat.read_msg(b) == 'ping'
+    assert chat.read_msg(b) == 'match {"osm_type": "way", "osm_id": 1}'
+    assert chat.read_json(b) == {'type': 'done', 'msg': 'café'}
+    assert chat.read_msg(b) is None
+    b.close()
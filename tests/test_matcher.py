@@ -168,7 +168,19 @@ def test_item_match_sql(monkeypatch):
     item = Item(entity=entity, tags=['building'])
     monkeypatch.setattr(matcher, 'current_app', MockApp)
     sql = matcher.item_match_sql(item, 'test')
-    assert "(tags ? 'building')" in sql
+    # calculate_tags() adds the disused forms of each key
+    assert ("(tags ?| array['abandoned:building', 'building', "
+            "'demolished:building', 'destroyed:building', 'disused:building', "
+            "'historic:building', 'ruins:building', 'was:building']::text[])") in sql
+
+def test_hstore_query():
+    tags = ['building', 'historic', 'amenity=place_of_worship', 'amenity=pub',
+            "name=St John's"]
+    expect = ("(tags ?| array['building', 'historic']::text[]) or\n "
+              "(string_to_array((tags->'amenity'), ';') && "
+              "array['place of worship', 'place_of_worship', 'pub']::text[]) or\n "
+              "(string_to_array((tags->'name'), ';') && array['St John''s']::text[])")
+    assert matcher.hstore_query(tags) == expect
 
 def find_item_matches(monkeypatch, osm_tags, item):
     def mock_run_sql(cur, sql, debug):
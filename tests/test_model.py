@@ -1,4 +1,4 @@
-from matcher.model import Item
+from matcher.model import Item, ItemCandidate
 from matcher import matcher
 import os.path
 
@@ -70,3 +70,39 @@ def test_calculate_tags(monkeypatch):
     result = item.calculate_tags()
     assert 'building' not in result
     assert result == tags | {'leisure=park'}
+
+def test_defunct_cats():
+    cats = ['Demolished buildings and structures in London',
+            'Abandoned railway stations in England',
+            'Former civil parishes in England',
+            'Grade II listed buildings in London']
+    item = Item(categories=cats)
+    assert item.defunct_cats() == cats[:2]
+
+def test_matching_tags():
+    item = Item(tags=['building', 'amenity=pub', 'shop'])
+    candidate = ItemCandidate(item=item, tags={'building': 'yes', 'amenity': 'pub'})
+    assert sorted(candidate.matching_tags()) == ['amenity=pub', 'building']
+
+    item.tags.add('building=yes')
+    assert sorted(candidate.matching_tags()) == ['amenity=pub', 'building', 'building=yes']
+
+def test_get_names():
+    test_entity = {
+        'labels': {
+            'en': {'language': 'en', 'value': 'Eiffel Tower'},
+            'pl': {'language': 'pl', 'value': 'Wieża Eiffla'},
+        },
+        'sitelinks': {
+            'enwiki': {'site': 'enwiki', 'title': 'Eiffel Tower'},
+            'plwiki': {'site': 'plwiki', 'title': 'Wieża Eiffla'},
+        },
+        'aliases': {
+            'en': [{'language': 'en', 'value': 'Tour Eiffel'}],
+        },
+    }
+    item = Item(entity=test_entity)
+    assert item.get_names() == {
+        'Tour Eiffel': [('alias', 'en')],
+        'Eiffel Tower': [('label', 'en'), ('sitelink', 'enwiki')],
+    }